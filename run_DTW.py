@@ -158,6 +158,7 @@ prob.set_val("density_dv", dens_circ.flatten())
 
 # prob.run_model()
 prob.run_driver()
+prob.cleanup()  # wait for the FEM plots to finish saving
 
 # Create video
 for case_name in cases:
@@ -158,6 +158,7 @@ if not only_postprocess_video:
 
     # prob.run_model()
     prob.run_driver()
+    prob.cleanup()  # wait for the FEM plots to finish saving
 
 # Create video
 for case_name in cases:
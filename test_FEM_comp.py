@@ -58,148 +58,151 @@ def callback_plot(x, fname=None):
     plt.close(fig)
 
 
-# USER INPUTS
-out_folder = os.path.join(cur_dir, "DTW_500w")
-
-use_snopt = True
-min_compliance_problem = False
-mass_frac = 0.1
-airport = "DTW"  # set to None to do other problem
-resolution = "500w"
-min_density = 1e-3  # lower bound on density
-
-if airport is None:
-    d = 101
-    nx = d
-    ny = d
-    n_elem = (nx - 1) * (ny - 1)
-    xlim = (0.0, 1.0)
-    ylim = xlim
-
-    T_set = np.full((nx, ny), np.inf)
-    T_set[[nx // 3, 2 * nx // 3], 0] = 200.0
-
-    q = np.zeros((nx - 1, ny - 1), dtype=float)
-    q[0, -1] = 2e5 / ((xlim[1] - xlim[0]) / (nx - 1)) ** 1.5
-    q[nx // 2, -1] = 5e5 / ((xlim[1] - xlim[0]) / (nx - 1)) ** 1.5
-    q[-1, -1] = 2e5 / ((xlim[1] - xlim[0]) / (nx - 1)) ** 1.5
-
-    density_lower = min_density
-else:
-    apt_data = load_airport(airport, resolution)
-    nx, ny, xlim, ylim = (apt_data["num_x"], apt_data["num_y"], apt_data["x_lim"], apt_data["y_lim"])
-    n_elem = (nx - 1) * (ny - 1)
-
-    T_set = 200.0 * apt_data["T_set_node"]["dumb"]
-    T_set[T_set == 0] = np.inf
-    q = 1e7 * apt_data["q_elem"]["dumb"]
-    # q[np.arange(2 * nx // 3), :] *= 20
-
-    density_lower = apt_data["runways"].flatten()
-    density_lower[density_lower < min_density] = min_density
-
-prob = om.Problem()
-simp = prob.model.add_subsystem(
-    "simp",
-    SIMP(
-        num_x=nx,
-        num_y=ny,
-        x_lim=xlim,
-        y_lim=ylim,
-        T_set=T_set,
-        q=q,
-        plot=None if use_snopt else [out_folder, 5],
-        airport_data=apt_data if airport else None,
-        r=4e-3,
-        p=3.0,
-        ks_rho=10.0,
-        use_smoothstep=False,
-    ),
-    promotes=["*"],
-)
-
-if min_compliance_problem:
-    prob.model.add_objective("max_temp")
-    prob.model.add_design_var("density_dv", lower=density_lower, upper=1.0)
-    prob.model.add_constraint("mass", upper=mass_frac * n_elem, linear=True)
-else:
-    prob.model.add_objective("mass")
-    prob.model.add_design_var("density_dv", lower=density_lower, upper=1.0)
-    prob.model.add_constraint("max_temp", upper=650)
-
-os.makedirs(out_folder, exist_ok=True)
-
-if use_snopt:
-    prob.driver = om.pyOptSparseDriver(optimizer="SNOPT")
-    prob.driver.hist_file = os.path.join(out_folder, "opt.hst")
-    prob.driver.options["debug_print"] = ["objs", "nl_cons", "ln_cons"]  # desvars, nl_cons, ln_cons, objs, totals
-    prob.driver.opt_settings["Iterations limit"] = 1e9
-    prob.driver.opt_settings["Minor iterations limit"] = 30_000
-    prob.driver.opt_settings["New superbasics limit"] = 5_000
-    prob.driver.opt_settings["Major iterations limit"] = 5_000
-    prob.driver.opt_settings["Violation limit"] = 1e4
-    prob.driver.opt_settings["Major optimality tolerance"] = 1e-5
-    prob.driver.opt_settings["Major feasibility tolerance"] = 1e-7
-    prob.driver.opt_settings["Print file"] = os.path.join(out_folder, "SNOPT_print.out")
-    prob.driver.opt_settings["Summary file"] = os.path.join(out_folder, "SNOPT_summary.out")
-    prob.driver.opt_settings["snSTOP function handle"] = callback_plot
-    prob.driver.opt_settings["Hessian updates"] = 50
-    prob.driver.opt_settings["Verify level"] = 0
-    prob.driver.opt_settings["Penalty"] = 1
-else:
-    prob.driver = om.pyOptSparseDriver(optimizer="IPOPT")
-    prob.driver.options["debug_print"] = ["objs", "nl_cons", "ln_cons"]  # desvars, nl_cons, ln_cons, objs, totals
-    prob.driver.opt_settings["output_file"] = os.path.join(out_folder, "IPOPT.out")
-    prob.driver.opt_settings["max_iter"] = 5000
-    prob.driver.opt_settings["constr_viol_tol"] = 1e-6
-    prob.driver.opt_settings["nlp_scaling_method"] = "gradient-based"
-    prob.driver.opt_settings["acceptable_tol"] = 1e-5
-    prob.driver.opt_settings["acceptable_iter"] = 0
-    prob.driver.opt_settings["tol"] = 1e-5
-    prob.driver.opt_settings["mu_strategy"] = "adaptive"
-    prob.driver.opt_settings["corrector_type"] = "affine"
-    prob.driver.opt_settings["limited_memory_max_history"] = 100
-    prob.driver.opt_settings["corrector_type"] = "primal-dual"
-    prob.driver.opt_settings["hessian_approximation"] = "limited-memory"
-
-prob.setup(mode="rev")
-
-# prob.set_val("density_dv", 0.5**(1/3))  # initialize density to 0.5
-
-mesh_x, mesh_y = simp.get_mesh()
-
-# om.n2(prob, show_browser=True, outfile=os.path.join(out_folder, "opt_n2.html"))
-
-prob.run_driver()
-
-callback_plot({"nMajor": 0}, fname=os.path.join(out_folder, f"opt_final.pdf"))
-
-# Create video
-subprocess.run(
-    [
-        "ffmpeg",
-        "-framerate",
-        "24",
-        "-pattern_type",
-        "glob",
-        "-i",
-        os.path.join(out_folder, f"opt_*.png"),
-        "-c:v",
-        "libx264",
-        "-pix_fmt",
-        "yuv420p",
-        os.path.join(out_folder, "opt_movie.mp4"),
-    ]
-)
-
-# # Smooth video
-# subprocess.run(
-#     [
-#         "ffmpeg",
-#         "-i",
-#         os.path.join(out_folder, "opt_move.mp4"),
-#         "-filter:v",
-#         "minterpolate=fps=24:mi_mode=mci:mc_mode=aobmc:me_mode=bidir:vsbmc=1",
-#         os.path.join(out_folder, "opt_movie_smoothed.mp4"),
-#     ]
-# )
+# Only run the optimization when this is run as a script (e.g., not when pytest collects this file)
+if __name__ == "__main__":
+    # USER INPUTS
+    out_folder = os.path.join(cur_dir, "DTW_500w")
+
+    use_snopt = True
+    min_compliance_problem = False
+    mass_frac = 0.1
+    airport = "DTW"  # set to None to do other problem
+    resolution = "500w"
+    min_density = 1e-3  # lower bound on density
+
+    if airport is None:
+        d = 101
+        nx = d
+        ny = d
+        n_elem = (nx - 1) * (ny - 1)
+        xlim = (0.0, 1.0)
+        ylim = xlim
+
+        T_set = np.full((nx, ny), np.inf)
+        T_set[[nx // 3, 2 * nx // 3], 0] = 200.0
+
+        q = np.zeros((nx - 1, ny - 1), dtype=float)
+        q[0, -1] = 2e5 / ((xlim[1] - xlim[0]) / (nx - 1)) ** 1.5
+        q[nx // 2, -1] = 5e5 / ((xlim[1] - xlim[0]) / (nx - 1)) ** 1.5
+        q[-1, -1] = 2e5 / ((xlim[1] - xlim[0]) / (nx - 1)) ** 1.5
+
+        density_lower = min_density
+    else:
+        apt_data = load_airport(airport, resolution)
+        nx, ny, xlim, ylim = (apt_data["num_x"], apt_data["num_y"], apt_data["x_lim"], apt_data["y_lim"])
+        n_elem = (nx - 1) * (ny - 1)
+
+        T_set = 200.0 * apt_data["T_set_node"]["dumb"]
+        T_set[T_set == 0] = np.inf
+        q = 1e7 * apt_data["q_elem"]["dumb"]
+        # q[np.arange(2 * nx // 3), :] *= 20
+
+        density_lower = apt_data["runways"].flatten()
+        density_lower[density_lower < min_density] = min_density
+
+    prob = om.Problem()
+    simp = prob.model.add_subsystem(
+        "simp",
+        SIMP(
+            num_x=nx,
+            num_y=ny,
+            x_lim=xlim,
+            y_lim=ylim,
+            T_set=T_set,
+            q=q,
+            plot=None if use_snopt else [out_folder, 5],
+            airport_data=apt_data if airport else None,
+            r=4e-3,
+            p=3.0,
+            ks_rho=10.0,
+            use_smoothstep=False,
+        ),
+        promotes=["*"],
+    )
+
+    if min_compliance_problem:
+        prob.model.add_objective("max_temp")
+        prob.model.add_design_var("density_dv", lower=density_lower, upper=1.0)
+        prob.model.add_constraint("mass", upper=mass_frac * n_elem, linear=True)
+    else:
+        prob.model.add_objective("mass")
+        prob.model.add_design_var("density_dv", lower=density_lower, upper=1.0)
+        prob.model.add_constraint("max_temp", upper=650)
+
+    os.makedirs(out_folder, exist_ok=True)
+
+    if use_snopt:
+        prob.driver = om.pyOptSparseDriver(optimizer="SNOPT")
+        prob.driver.hist_file = os.path.join(out_folder, "opt.hst")
+        prob.driver.options["debug_print"] = ["objs", "nl_cons", "ln_cons"]  # desvars, nl_cons, ln_cons, objs, totals
+        prob.driver.opt_settings["Iterations limit"] = 1e9
+        prob.driver.opt_settings["Minor iterations limit"] = 30_000
+        prob.driver.opt_settings["New superbasics limit"] = 5_000
+        prob.driver.opt_settings["Major iterations limit"] = 5_000
+        prob.driver.opt_settings["Violation limit"] = 1e4
+        prob.driver.opt_settings["Major optimality tolerance"] = 1e-5
+        prob.driver.opt_settings["Major feasibility tolerance"] = 1e-7
+        prob.driver.opt_settings["Print file"] = os.path.join(out_folder, "SNOPT_print.out")
+        prob.driver.opt_settings["Summary file"] = os.path.join(out_folder, "SNOPT_summary.out")
+        prob.driver.opt_settings["snSTOP function handle"] = callback_plot
+        prob.driver.opt_settings["Hessian updates"] = 50
+        prob.driver.opt_settings["Verify level"] = 0
+        prob.driver.opt_settings["Penalty"] = 1
+    else:
+        prob.driver = om.pyOptSparseDriver(optimizer="IPOPT")
+        prob.driver.options["debug_print"] = ["objs", "nl_cons", "ln_cons"]  # desvars, nl_cons, ln_cons, objs, totals
+        prob.driver.opt_settings["output_file"] = os.path.join(out_folder, "IPOPT.out")
+        prob.driver.opt_settings["max_iter"] = 5000
+        prob.driver.opt_settings["constr_viol_tol"] = 1e-6
+        prob.driver.opt_settings["nlp_scaling_method"] = "gradient-based"
+        prob.driver.opt_settings["acceptable_tol"] = 1e-5
+        prob.driver.opt_settings["acceptable_iter"] = 0
+        prob.driver.opt_settings["tol"] = 1e-5
+        prob.driver.opt_settings["mu_strategy"] = "adaptive"
+        prob.driver.opt_settings["corrector_type"] = "affine"
+        prob.driver.opt_settings["limited_memory_max_history"] = 100
+        prob.driver.opt_settings["corrector_type"] = "primal-dual"
+        prob.driver.opt_settings["hessian_approximation"] = "limited-memory"
+
+    prob.setup(mode="rev")
+
+    # prob.set_val("density_dv", 0.5**(1/3))  # initialize density to 0.5
+
+    mesh_x, mesh_y = simp.get_mesh()
+
+    # om.n2(prob, show_browser=True, outfile=os.path.join(out_folder, "opt_n2.html"))
+
+    prob.run_driver()
+    prob.cleanup()  # wait for the FEM plots to finish saving
+
+    callback_plot({"nMajor": 0}, fname=os.path.join(out_folder, f"opt_final.pdf"))
+
+    # Create video
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-framerate",
+            "24",
+            "-pattern_type",
+            "glob",
+            "-i",
+            os.path.join(out_folder, f"opt_*.png"),
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+            os.path.join(out_folder, "opt_movie.mp4"),
+        ]
+    )
+
+    # # Smooth video
+    # subprocess.run(
+    #     [
+    #         "ffmpeg",
+    #         "-i",
+    #         os.path.join(out_folder, "opt_move.mp4"),
+    #         "-filter:v",
+    #         "minterpolate=fps=24:mi_mode=mci:mc_mode=aobmc:me_mode=bidir:vsbmc=1",
+    #         os.path.join(out_folder, "opt_movie_smoothed.mp4"),
+    #     ]
+    # )
@@ -3,9 +3,9 @@ import scipy.sparse as sp
 import openmdao.api as om
 from .utils import gen_mesh
 from collections.abc import Iterable
-from time import time
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import matplotlib
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 use_pypardiso = False
@@ -17,6 +17,34 @@ except ImportError:
     import scipy.sparse.linalg as splinalg
 
 
+def _pardiso_refactorize(solver, A):
+    """
+    Numerically refactorize a matrix with the same sparsity pattern as the one the PyPardisoSolver has
+    already factorized. This reuses Pardiso's symbolic analysis (phase 22 instead of 12), which the public
+    factorize method always redoes. It calls private pypardiso methods, which have only been checked
+    against pypardiso 0.4.7, so any other version falls back to the public factorize.
+
+    Parameters
+    ----------
+    solver : pypardiso.PyPardisoSolver
+        Solver that has already factorized a matrix with the same sparsity pattern as A.
+    A : scipy sparse CSR matrix
+        Matrix to factorize.
+    """
+    if getattr(pypardiso, "__version__", None) != "0.4.7":
+        solver.factorize(A)
+        return
+
+    # Same as PyPardisoSolver.factorize other than the phase
+    solver._check_A(A)
+    if A.nnz > solver.size_limit_storage:
+        solver.factorized_A = solver._hash_csr_matrix(A)
+    else:
+        solver.factorized_A = A.copy()
+    solver.set_phase(22)
+    solver._call_pardiso(A, np.zeros((A.shape[0], 1)))
+
+
 class FEM(om.ImplicitComponent):
     """
     Finite element method component.
@@ -52,7 +80,8 @@ class FEM(om.ImplicitComponent):
         Material thermal conductivity, by default 1000
     plot : list
         List with the output folder and frequency at which to plot, for example ["~/Documents/plot", 10],
-        by default will not plot. Make sure the directory is absolute, not relative!
+        by default will not plot. Make sure the directory is absolute, not relative! The plots are saved
+        in a background thread, so call the problem's cleanup method to wait for them to finish.
     clim : list or tuple
         Iterable with the lower and upper bounds for the colorbar when plotting, by default auto adjust.
     airport_data : dict
@@ -73,10 +102,6 @@ class FEM(om.ImplicitComponent):
         self.options.declare("airport_data", default=None, desc="Airport data to make the plot cool")
 
     def setup(self):
-        from time import time
-
-        t_start = time()
-        print("Setting up FEM...", end="")
         self.nx = nx = self.options["num_x"]
         self.ny = ny = self.options["num_y"]
         self.mesh_x, self.mesh_y = gen_mesh(nx, ny, self.options["x_lim"], self.options["y_lim"])
@@ -93,11 +118,22 @@ class FEM(om.ImplicitComponent):
             (1 / sq3, -1 / sq3),
             (1 / sq3, 1 / sq3),
         ]
-        self.dN_dxi = []
-        self.N = []
-        for xi, eta in self.quad_pts:
-            self.dN_dxi.append(FEM._dN_dxi(xi, eta))
-            self.N.append(FEM._N(xi, eta))
+        # These are stacked along the first axis, so N has shape (num quad points x 4)
+        # and dN_dxi has shape (num quad points x 2 x 4)
+        self.N = np.array([FEM._N(xi, eta) for xi, eta in self.quad_pts])
+        self.dN_dxi = np.array([FEM._dN_dxi(xi, eta) for xi, eta in self.quad_pts])
+
+        # Global indices of each element's nodes in CCW order starting at the lower left, shape (n_elem x 4)
+        i, j = np.meshgrid(np.arange(nx - 1), np.arange(ny - 1), indexing="ij")
+        i = i.flatten()
+        j = j.flatten()
+        self.elem_nodes = np.column_stack([i * ny + j, (i + 1) * ny + j, (i + 1) * ny + j + 1, i * ny + j + 1])
+
+        # Nodes with specified temperatures and the temperatures they are set to
+        T_set = self.options["T_set"].flatten()
+        self.bc_mask = np.isfinite(T_set)
+        self.bc_nodes = np.flatnonzero(self.bc_mask)
+        self.bc_values = T_set[self.bc_nodes]
 
         # Stiffness matrix
         self.density = np.zeros((nx - 1) * (ny - 1))
@@ -115,8 +151,7 @@ class FEM(om.ImplicitComponent):
         # factorized stiffness matrix even when there are multipoint cases
         if use_pypardiso:
             self.lin_solver = pypardiso.PyPardisoSolver()
-
-        print(f"done in {time() - t_start} sec")
+            self.lin_solver_analyzed = False
 
         self.plot_counter = -1
         self.plot_result = False
@@ -129,20 +164,17 @@ class FEM(om.ImplicitComponent):
             self.cmap_white = matplotlib.colors.LinearSegmentedColormap.from_list("", ["#ffffffff", "#ffffff00"])
             self.cmap_runway = matplotlib.colors.LinearSegmentedColormap.from_list("", ["#00000000", "#00000055"])
             self.cmap_building = matplotlib.colors.LinearSegmentedColormap.from_list("", ["#00000000", "#000000ff"])
+            self.plot_pool = None  # created on the first plot so it can be shut down in cleanup
+            self.plot_futures = []
 
     def apply_nonlinear(self, inputs, outputs, residuals):
-        print("apply_nonlinear...", end="")
-        t_start = time()
         self._update_global_stiffness(inputs["density"])
-        residuals["temp"] = self.K_glob @ outputs["temp"] - self.F_glob.flatten()
-        print(f"done in {time() - t_start} sec")
+        residuals["temp"] = self.K_glob @ outputs["temp"]
+        residuals["temp"] -= self.F_glob
 
     def solve_nonlinear(self, inputs, outputs):
-        print("solve_nonlinear...", end="")
-        t_start = time()
         self._update_global_stiffness(inputs["density"])
-        outputs["temp"] = self._spsolve(self.K_glob, self.F_glob)
-        print(f"done in {time() - t_start} sec")
+        outputs["temp"] = self._spsolve(self.F_glob)
 
         if self.plot_result:
             self.plot_counter += 1
@@ -150,99 +182,56 @@ class FEM(om.ImplicitComponent):
             if self.plot_counter % self.plot_freq != 0:
                 return
 
-            T = outputs["temp"].reshape(self.nx, self.ny)
-            density = inputs["density"].reshape(self.nx - 1, self.ny - 1)
-
-            if self.options["airport_data"] is None:
-                fig, axs = plt.subplots(2, 1, figsize=(5, 8))
-                c = axs[0].contourf(self.mesh_x, self.mesh_y, T, 100, cmap="coolwarm")
-                if self.plot_clim is not None:
-                    c.set_clim(self.plot_clim)
-                axs[0].pcolorfast(
-                    self.mesh_x, self.mesh_y, density, cmap=self.cmap_white, vmin=0.0, vmax=1.0, zorder=10
-                )
-                cbar = fig.colorbar(c, ax=axs[0])
-                cbar.set_label("Temperature (K?)")
-                if self.plot_clim is not None:
-                    cbar.ax.set_ylim(self.plot_clim)
-                    cbar.set_ticks(np.round(np.linspace(*self.plot_clim, 8)))
-                axs[0].set_aspect("equal")
-
-                c = axs[1].pcolorfast(self.mesh_x, self.mesh_y, density, cmap="Blues", vmin=0.0, vmax=1.0)
-                cbar = fig.colorbar(c, ax=axs[1])
-                cbar.set_label("Density")
-                axs[1].set_aspect("equal")
-            else:
-                xlim, ylim = (self.options["x_lim"], self.options["y_lim"])
-                apt_data = self.options["airport_data"]
-                fig, ax = plt.subplots(figsize=((xlim[1] - xlim[0]) * 10, (ylim[1] - ylim[0]) * 10))
-                c = ax.contourf(self.mesh_x, self.mesh_y, T, 100, cmap="coolwarm", zorder=0)
-                if self.plot_clim is not None:
-                    c.set_clim(self.plot_clim)
-                ax.pcolorfast(self.mesh_x, self.mesh_y, density, cmap=self.cmap_white, vmin=0.0, vmax=1.0, zorder=1)
-                ax.pcolorfast(
-                    self.mesh_x, self.mesh_y, apt_data["runways"], cmap=self.cmap_runway, vmin=0.0, vmax=1.0, zorder=2
-                )
-                ax.pcolorfast(
-                    self.mesh_x, self.mesh_y, apt_data["buildings"], cmap=self.cmap_building, vmin=0.0, vmax=1.0, zorder=2
-                )
-                cbar = fig.colorbar(c, ax=ax, fraction=0.02, pad=0.05)
-                cbar.set_label("Temperature (K?)")
-                if self.plot_clim is not None:
-                    cbar.ax.set_ylim(self.plot_clim)
-                    cbar.set_ticks(np.round(np.linspace(*self.plot_clim, 8)))
-                ax.set_aspect("equal")
-                ax.set_axis_off()
-
-            fig.savefig(os.path.join(self.plot_dir, f"opt_{self.plot_counter:05d}.png"), dpi=300)
-            plt.close(fig)
+            # Drop the plots that have finished, raising any errors that occurred while plotting them
+            done = [future for future in self.plot_futures if future.done()]
+            self.plot_futures = [future for future in self.plot_futures if future not in done]
+            for future in done:
+                future.result()
+
+            # Plotting can be much slower than solving, so wait on the oldest plot rather than letting
+            # copies of the results pile up in memory (at most two plots in flight)
+            while len(self.plot_futures) > 1:
+                self.plot_futures.pop(0).result()
+
+            # Render the plot in the background so the optimization doesn't wait on it
+            if self.plot_pool is None:
+                self.plot_pool = ThreadPoolExecutor(max_workers=1)
+            self.plot_futures.append(
+                self.plot_pool.submit(self._plot, outputs["temp"].copy(), inputs["density"].copy(), self.plot_counter)
+            )
 
     def linearize(self, inputs, outputs, _):
-        print("linearize...", end="")
-        t_start = time()
-
         # Matrix for partial(residual)/partial(temperature)
         self._update_global_stiffness(inputs["density"])
         self.pRpu = self.K_glob
 
         # Matrix for partial(residual)/partial(density)
-        pRpx_temp_mat = sp.csr_matrix((outputs["temp"][self.pRpx_temp_idx], (self.pRpx_temp_rows, self.pRpx_temp_cols)))
-        self.pRpx = self.pRpx_coeff_mat.dot(pRpx_temp_mat)
-
-        print(f"done in {time() - t_start} sec")
+        self.pRpx.data[:] = self.pRpx_data_mat @ outputs["temp"]
 
     def apply_linear(self, inputs, outputs, d_inputs, d_outputs, d_residuals, mode):
         if "temp" not in d_residuals:
             return
 
+        # Skip the sparse matrix-vector products when the seed is zero, which is common
+        # when OpenMDAO only seeds some of the variables
         if mode == "fwd":
-            print("apply_linear fwd...", end="")
-            t_start = time()
-            if "temp" in d_outputs:
+            if "temp" in d_outputs and d_outputs["temp"].any():
                 d_residuals["temp"] += self.pRpu @ d_outputs["temp"]
-            if "density" in d_inputs:
+            if "density" in d_inputs and d_inputs["density"].any():
                 d_residuals["temp"] += self.pRpx @ d_inputs["density"]
         elif mode == "rev":
-            print("apply_linear rev...", end="")
-            t_start = time()
+            if not d_residuals["temp"].any():
+                return
             if "temp" in d_outputs:
                 d_outputs["temp"] += self.pRpu.T @ d_residuals["temp"]
             if "density" in d_inputs:
                 d_inputs["density"] += self.pRpx.T @ d_residuals["temp"]
 
-        print(f"done in {time() - t_start} sec")
-
     def solve_linear(self, d_outputs, d_residuals, mode):
         if mode == "fwd":
-            print("solve_linear fwd...", end="")
-            t_start = time()
-            d_outputs["temp"] = self._spsolve(self.pRpu, d_residuals["temp"])
+            d_outputs["temp"] = self._spsolve(d_residuals["temp"])
         elif mode == "rev":
-            print("solve_linear rev...", end="")
-            t_start = time()
-            d_residuals["temp"] = self._spsolve(self.pRpu, d_outputs["temp"])
-
-        print(f"done in {time() - t_start} sec")
+            d_residuals["temp"] = self._spsolve(d_outputs["temp"], transpose=True)
 
     def get_mesh(self):
         """
@@ -257,6 +246,79 @@ class FEM(om.ImplicitComponent):
         """
         return self.mesh_x, self.mesh_y
 
+    def cleanup(self):
+        """
+        Wait for any plots still being rendered in the background and shut down the plotting thread.
+        This is called by the problem's cleanup method.
+        """
+        super().cleanup()
+        if self.plot_result and self.plot_pool is not None:
+            self.plot_pool.shutdown(wait=True)
+            self.plot_pool = None  # the next plot starts a new one
+            futures, self.plot_futures = (self.plot_futures, [])
+            for future in futures:
+                future.result()  # also raises any errors that occurred while plotting
+
+    def _plot(self, temp, density, plot_counter):
+        """
+        Plot the temperatures and densities and save the figure to the plot directory. This is
+        run in a background thread, so it uses matplotlib's object oriented interface rather than pyplot.
+
+        Parameters
+        ----------
+        temp : numpy array
+            Nodal temperatures, flattened into a 1D array.
+        density : numpy array
+            Densities of each element, flattened into a 1D array.
+        plot_counter : int
+            Number of times solve_nonlinear has been called, used for the file name.
+        """
+        T = temp.reshape(self.nx, self.ny)
+        density = density.reshape(self.nx - 1, self.ny - 1)
+
+        if self.options["airport_data"] is None:
+            fig = Figure(figsize=(5, 8))
+            axs = fig.subplots(2, 1)
+            c = axs[0].contourf(self.mesh_x, self.mesh_y, T, 100, cmap="coolwarm")
+            if self.plot_clim is not None:
+                c.set_clim(self.plot_clim)
+            axs[0].pcolorfast(self.mesh_x, self.mesh_y, density, cmap=self.cmap_white, vmin=0.0, vmax=1.0, zorder=10)
+            cbar = fig.colorbar(c, ax=axs[0])
+            cbar.set_label("Temperature (K?)")
+            if self.plot_clim is not None:
+                cbar.ax.set_ylim(self.plot_clim)
+                cbar.set_ticks(np.round(np.linspace(*self.plot_clim, 8)))
+            axs[0].set_aspect("equal")
+
+            c = axs[1].pcolorfast(self.mesh_x, self.mesh_y, density, cmap="Blues", vmin=0.0, vmax=1.0)
+            cbar = fig.colorbar(c, ax=axs[1])
+            cbar.set_label("Density")
+            axs[1].set_aspect("equal")
+        else:
+            xlim, ylim = (self.options["x_lim"], self.options["y_lim"])
+            apt_data = self.options["airport_data"]
+            fig = Figure(figsize=((xlim[1] - xlim[0]) * 10, (ylim[1] - ylim[0]) * 10))
+            ax = fig.subplots()
+            c = ax.contourf(self.mesh_x, self.mesh_y, T, 100, cmap="coolwarm", zorder=0)
+            if self.plot_clim is not None:
+                c.set_clim(self.plot_clim)
+            ax.pcolorfast(self.mesh_x, self.mesh_y, density, cmap=self.cmap_white, vmin=0.0, vmax=1.0, zorder=1)
+            ax.pcolorfast(
+                self.mesh_x, self.mesh_y, apt_data["runways"], cmap=self.cmap_runway, vmin=0.0, vmax=1.0, zorder=2
+            )
+            ax.pcolorfast(
+                self.mesh_x, self.mesh_y, apt_data["buildings"], cmap=self.cmap_building, vmin=0.0, vmax=1.0, zorder=2
+            )
+            cbar = fig.colorbar(c, ax=ax, fraction=0.02, pad=0.05)
+            cbar.set_label("Temperature (K?)")
+            if self.plot_clim is not None:
+                cbar.ax.set_ylim(self.plot_clim)
+                cbar.set_ticks(np.round(np.linspace(*self.plot_clim, 8)))
+            ax.set_aspect("equal")
+            ax.set_axis_off()
+
+        fig.savefig(os.path.join(self.plot_dir, f"opt_{plot_counter:05d}.png"), dpi=300)
+
     def _update_global_stiffness(self, density):
         """
         Set up the global stiffness matrix and store it in self.K_glob (overwrites).
@@ -269,70 +331,67 @@ class FEM(om.ImplicitComponent):
             2D array of elements. By default 1 for every element.
         """
         # If density hasn't changed, no need to update it
-        if not np.any(self.density != density):
+        if np.array_equal(self.density, density):
             return
         self.density[:] = density[:]
 
-        vals = self.K_vals.copy()
-        vals[self.idx_val_map] *= density[self.idx_density_map]
+        # The sparsity pattern never changes and the values are linear in the densities,
+        # so compute the existing CSR data array directly with a single sparse matrix-vector product
+        self.K_glob.data[:] = self.K_data_mat @ density
+
+        # Rows of nodes with specified temperatures become the corresponding row of the identity matrix
+        self.K_glob.data[self.bc_diag_data_idx] = 1.0
 
-        self.K_glob = sp.coo_matrix((vals, (self.K_rows, self.K_cols))).tocsr()
+        # The old factorization no longer matches the stiffness matrix
+        self.K_glob_factorized = False
 
     def _update_global_force(self):
         """
         Set up the global force vector and store it in self.F_glob (overwrites).
         """
-        self.F_glob *= 0  # reset global stiffness matrix
-
-        # Loop over each element and put its local stiffness matrix in the global one
-        nonzero_q_idx = np.argwhere(self.options["q"] != 0)
-        for i, j in nonzero_q_idx:
-            # 2D indices in the mesh of the nodes surrounding the current element
-            idx = np.array(
-                [
-                    [i, j],
-                    [i + 1, j],
-                    [i + 1, j + 1],
-                    [i, j + 1],
-                ]
-            )
-
-            # Convert the 2D indices to flattened 1D to determine where in the
-            # unknown vector (and global stiffness matrix) they'd be
-            idx_glob = self._flattened_node_ij(idx[:, 0], idx[:, 1])
-
-            self.F_glob[idx_glob] += self._local_force(i, j, self.options["q"][i, j])
+        # Because we use meshgrid, all elements are the same size and shape, so the local force
+        # vector of each element is the local force vector for a unit heat scaled by its heat
+        q = self.options["q"].flatten()
+        heated_elem = np.flatnonzero(q)
+        F_loc = q[heated_elem, np.newaxis] * self._local_force(0, 0, 1.0)
+
+        # Add them all to the global one at once (bincount sums the contributions
+        # to nodes shared by multiple elements and is much faster than np.add.at)
+        self.F_glob[:] = np.bincount(
+            self.elem_nodes[heated_elem].flatten(), weights=F_loc.flatten(), minlength=self.F_glob.size
+        )
 
         # Any temperatures that are specified get the specified temperature in the force vector
-        finite_T_set_idx = np.argwhere(np.isfinite(self.options["T_set"]))
-        for i, j in finite_T_set_idx:
-            self.F_glob[self._flattened_node_ij(i, j)] = self.options["T_set"][i, j]
+        self.F_glob[self.bc_nodes] = self.bc_values
 
     def _preprocess_global_stiffness(self):
         """
         By splitting up the global stiffness matrix into four components where there is no
         overlap of elements at any spot in the matrix, we can avoid doing the global stiffness
         matrix assembly every time the densities change. Instead, we simple have to multiply the
-        correct spots in the four components by the associated densities and use the resulting
-        values to initialize a sparse matrix.
+        correct spots in the four components by the associated densities and sum the resulting
+        values into the data array of a sparse matrix whose structure never changes.
 
-        This method creates those four components of the stiffness matrix, along with the associated
-        rows and columns of the values. It also creates the index map that defines which densities
-        to multiply each element the four components by. Because it depends only on the mesh and
-        temperature boundary conditions (which are defined once at the beginning), this method
-        must run only once at the start of the evaluation/optimization.
+        This method creates the CSR stiffness matrix and a sparse matrix that does the multiplying
+        and summing. Each row of that matrix corresponds to an entry in the CSR data array and each
+        column to an element, and its values are the entries of the four components that are summed
+        into that spot in the data array. Because it depends only on the mesh and temperature
+        boundary conditions (which are defined once at the beginning), this method must run only
+        once at the start of the evaluation/optimization.
 
-        Creating the stifness matrix will look something like this:
-            vals = self.K_vals.copy()
-            vals[self.idx_val_map] *= density[self.idx_density_map]
-            self.K_glob = sp.coo_matrix((vals, (self.K_rows, self.K_cols))).tocsr()
+        Rows of the stiffness matrix that correspond to nodes with a specified temperature must be
+        replaced with the matching row of the identity matrix. The rows of the data matrix for these
+        rows are left empty and the indices in the CSR data array of their diagonal entries are
+        computed here so they can be set to one directly after each update.
+
+        Updating the stifness matrix will look something like this:
+            self.K_glob.data[:] = self.K_data_mat @ density
+            self.K_glob.data[self.bc_diag_data_idx] = 1.0
 
         The member variables this function adds are:
-            K_rows
-            K_cols
-            K_vals
-            idx_density_map
-            idx_val_map
+            K_glob
+            K_data_mat
+            bc_diag_data_idx
         """
         nx, ny = (self.nx, self.ny)
         n_elem = (nx - 1) * (ny - 1)
@@ -343,74 +402,28 @@ class FEM(om.ImplicitComponent):
         # stiffness matrix is identical for each element.
         K_loc = self._local_stiffness(0, 0)
 
-        # Global indices of the corner nodes of each element
-        i, j = np.meshgrid(np.arange(nx - 1), np.arange(ny - 1), indexing="ij")
-        i = i.flatten()
-        j = j.flatten()
-        node_glob_idx = np.array(
-            [
-                i * ny + j,  # lower left
-                (i + 1) * ny + j,  # lower right
-                (i + 1) * ny + j + 1,  # upper right
-                i * ny + j + 1,  # upper left
-            ]
+        # The values are ordered by element, then by the row of the local stiffness matrix, and then by its column
+        K_rows = np.repeat(self.elem_nodes, nodes_per_elem, axis=1).flatten()
+        K_cols = np.tile(self.elem_nodes, nodes_per_elem).flatten()
+        K_vals = np.tile(K_loc.flatten(), n_elem)
+        K_elem = np.repeat(np.arange(n_elem), nodes_per_elem**2)
+
+        # Build the CSR structure directly from the unique flattened 2D indices of the entries. These are sorted,
+        # so they are ordered by row and then by column like CSR data with sorted indices. The inverse gives the
+        # index in the CSR data array of each value (duplicates from neighboring elements map to the same spot).
+        K_flat_idx, K_data_idx = np.unique(K_rows * nx * ny + K_cols, return_inverse=True)
+        data_rows, indices = np.divmod(K_flat_idx, nx * ny)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(data_rows, minlength=nx * ny))))
+        self.K_glob = sp.csr_matrix((np.ones(indices.size), indices, indptr), shape=(nx * ny,) * 2)
+
+        # Leave out the values in rows where the temperature is set, which don't depend on density
+        keep = np.logical_not(self.bc_mask[K_rows])
+        self.K_data_mat = sp.csr_matrix(
+            (K_vals[keep], (K_data_idx[keep], K_elem[keep])), shape=(self.K_glob.nnz, n_elem)
         )
 
-        self.K_rows = []
-        self.K_cols = []
-        self.K_vals = []
-        self.idx_density_map = []
-        self.idx_val_map = []
-        for i_corner, corner_idx in enumerate(node_glob_idx):
-            self.K_rows.append(np.repeat(corner_idx, nodes_per_elem))
-            self.K_cols.append(node_glob_idx.T.flatten())
-            self.K_vals.append(np.tile(K_loc[i_corner, :], n_elem))
-            self.idx_density_map.append(np.repeat(np.arange(n_elem), nodes_per_elem))
-            self.idx_val_map.append(np.arange(n_elem * nodes_per_elem) + n_elem * nodes_per_elem * i_corner)
-
-        # Account for the specified nodal temperatures.
-        # Start by setting the stiffness matrix values to have a one
-        # along the diagonal where the temperatures are specified.
-        T_is_set = np.isfinite(self.options["T_set"]).flatten()
-        diag_mask = np.zeros(n_elem * 4)
-        for i_corner in range(nodes_per_elem):
-            diag_mask *= 0
-            diag_mask[i_corner::nodes_per_elem] = 1
-            T_set_mask = np.repeat(T_is_set[node_glob_idx[i_corner]], nodes_per_elem)
-            self.K_vals[i_corner][T_set_mask] = 0.0
-
-            # Mask of the diagonals that must be set to ones
-            T_set_diag = np.logical_and(T_set_mask, diag_mask)
-
-            # The COO sparse matrix format will end up summing duplicate row and column values.
-            # To account for this, we must set any values that come up twice (middle edge nodes) to
-            # 0.5, any values that come up four times (interior nodes) to 0.25, and any values that
-            # come up once (corner nodes) to 1.0.
-            diag_glob_idx = node_glob_idx[i_corner][T_is_set[node_glob_idx[i_corner]]]  # glob idx of set nodes
-            diag_j = diag_glob_idx % ny  # i idx of set nodes
-            diag_i = (diag_glob_idx - diag_j) // ny  # j idx of set nodes
-            is_corner = ((diag_i == 0) | (diag_i == nx - 1)) & ((diag_j == 0) | (diag_j == ny - 1))
-            is_edge = ((diag_i == 0) | (diag_i == nx - 1) | (diag_j == 0) | (diag_j == ny - 1)) & np.logical_not(
-                is_corner
-            )
-            is_interior = np.logical_not(is_corner) & np.logical_not(is_edge)
-
-            # The indexing isn't pretty, but it's what must be done to avoid assigning values to a copy of K_vals
-            self.K_vals[i_corner][np.ix_(T_set_diag)[0][np.ix_(is_corner)]] = 1.0
-            self.K_vals[i_corner][np.ix_(T_set_diag)[0][np.ix_(is_edge)]] = 0.5
-            self.K_vals[i_corner][np.ix_(T_set_diag)[0][np.ix_(is_interior)]] = 0.25
-
-            # Remove any indices from the val and density maps that correspond to the ones along the diagonal since
-            # those are not multiplied by density. The indices we've zeroed out will be removed in a sec, hold your horses.
-            self.idx_density_map[i_corner] = np.delete(self.idx_density_map[i_corner], np.ix_(T_set_diag)[0])
-            self.idx_val_map[i_corner] = np.delete(self.idx_val_map[i_corner], np.ix_(T_set_diag)[0])
-
-        # Flatten the values
-        self.K_rows = np.array(self.K_rows).flatten()
-        self.K_cols = np.array(self.K_cols).flatten()
-        self.K_vals = np.array(self.K_vals).flatten()
-        self.idx_val_map = np.hstack(self.idx_val_map)
-        self.idx_density_map = np.hstack(self.idx_density_map)
+        # Account for the specified nodal temperatures by finding where their diagonals live in the CSR data array
+        self.bc_diag_data_idx = np.flatnonzero(self.bc_mask[data_rows] & (self.K_glob.indices == data_rows))
 
     def _preprocess_pRpx(self):
         """
@@ -419,24 +432,20 @@ class FEM(om.ImplicitComponent):
         only on the mesh and which temperatures are set, so this must be called only once at the
         beginning.
 
-        The approach used here will compute the pRpx matrix by multiplying two sparse matrices.
-        The first sparse matrix contains copies of the local stiffness matrix. It does not depend
-        on density or temperature, so it is fully definied when this function is called. The second
-        sparse matrix is the temperatures arranged so that when multiplied by the first it returns
-        pRpx. The temperatures will change at runtime, so here we define the rows and columns
-        that define the second matrix's sparsity. We also define the indices from the temperature
-        that return the values for the sparse matrix.
+        The column of pRpx for each element is nonzero only at the element's four nodes, where it is the
+        local stiffness matrix times the element's nodal temperatures. The sparsity pattern of pRpx never
+        changes, so it is built once here. Since its values are linear in the temperatures, they can be
+        computed with a single sparse matrix-vector product. Each row of pRpx_data_mat corresponds to an
+        entry in pRpx's data array and holds the four local stiffness values that multiply the element's
+        nodal temperatures. Rows where the temperature is set do not depend on density, so they are removed.
 
         Computing pRpx after calling this function will look something like:
 
-            pRpx_temp_mat = sp.csr_matrix((outputs["temp"][self.pRpx_temp_idx], (self.pRpx_temp_rows, self.pRpx_temp_cols)))
-            pRpx = self.pRpx_coeff_mat.dot(pRpx_temp_mat)
+            self.pRpx.data[:] = self.pRpx_data_mat @ outputs["temp"]
 
         The member variables this functions adds are:
-            pRpx_coeff_mat
-            pRpx_temp_idx
-            pRpx_temp_rows
-            pRpx_temp_cols
+            pRpx
+            pRpx_data_mat
         """
         nx, ny = (self.nx, self.ny)
         n_elem = (nx - 1) * (ny - 1)
@@ -447,45 +456,31 @@ class FEM(om.ImplicitComponent):
         # stiffness matrix is identical for each element.
         K_loc = self._local_stiffness(0, 0)
 
-        # Rearrange K_loc so instead of being ordered by the nodes of an element CCW,
-        # they're ordered lower left, upper left, lower right, and upper right because
-        # this is the ordering used in the global indexing
-        idx_reorder_K = [0, 3, 1, 2]
-        K_loc = K_loc[np.ix_(idx_reorder_K, idx_reorder_K)]
-
-        # Global indices of the corners of the elements. This ordering is not CCW as it is in some other places!
-        i, j = np.meshgrid(np.arange(nx - 1), np.arange(ny - 1), indexing="ij")
-        i = i.flatten()
-        j = j.flatten()
-        #                          lower left  upper left      lower right       upper right
-        nodal_glob_idx = np.array([i * ny + j, i * ny + j + 1, (i + 1) * ny + j, (i + 1) * ny + j + 1])
-
-        # The rows and columns are ordered such that they iterate over each element's K matrix (after being reordered)
-        # starting at the top left, going through each row left to right, then to the next row and repeat
-        coeff_mat_rows = np.repeat(nodal_glob_idx.T, nodes_per_elem)
-        coeff_mat_cols = np.tile(np.arange(nodes_per_elem), n_elem * nodes_per_elem) + np.repeat(
-            np.arange(n_elem) * nodes_per_elem, nodes_per_elem**2
-        )
-        coeff_mat_vals = np.tile(K_loc.flatten(), n_elem)
+        # The entries of pRpx are ordered by element and then by the element's nodes (CCW)
+        rows = self.elem_nodes.flatten()
+        cols = np.repeat(np.arange(n_elem), nodes_per_elem)
 
         # Remove any rows where the temperature is set
-        T_is_set = np.isfinite(self.options["T_set"]).flatten()
-        idx_where_T_is_set = np.argwhere(T_is_set).flatten()
-        idx_to_remove = np.in1d(coeff_mat_rows, idx_where_T_is_set)
-        coeff_mat_rows = np.delete(coeff_mat_rows, idx_to_remove)
-        coeff_mat_cols = np.delete(coeff_mat_cols, idx_to_remove)
-        coeff_mat_vals = np.delete(coeff_mat_vals, idx_to_remove)
-
-        # Finally, we have the pRpx coefficient matrix!
-        self.pRpx_coeff_mat = sp.csr_matrix(
-            (coeff_mat_vals, (coeff_mat_rows, coeff_mat_cols)), shape=(nx * ny, n_elem * nodes_per_elem)
+        keep = np.logical_not(self.bc_mask[rows])
+        rows = rows[keep]
+        cols = cols[keep]
+
+        # Build the sparsity pattern of pRpx once (the data are overwritten in linearize)
+        self.pRpx = sp.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(nx * ny, n_elem))
+        self.pRpx.sort_indices()
+
+        # Position of each entry in pRpx's data array
+        data_rows = np.repeat(np.arange(nx * ny), np.diff(self.pRpx.indptr))
+        data_idx = np.searchsorted(data_rows * n_elem + self.pRpx.indices, rows * n_elem + cols)
+
+        # Each entry of pRpx is its row of the local stiffness matrix dotted with the element's nodal temperatures
+        data_mat_rows = np.repeat(data_idx, nodes_per_elem)
+        data_mat_cols = self.elem_nodes[cols].flatten()
+        data_mat_vals = np.tile(K_loc, (n_elem, 1))[keep].flatten()
+        self.pRpx_data_mat = sp.csr_matrix(
+            (data_mat_vals, (data_mat_rows, data_mat_cols)), shape=(self.pRpx.nnz, nx * ny)
         )
 
-        # Set up the stuff for the pRpx temperature matrix
-        self.pRpx_temp_rows = np.arange(n_elem * nodes_per_elem, dtype=int)
-        self.pRpx_temp_cols = np.repeat(np.arange(n_elem, dtype=int), nodes_per_elem)
-        self.pRpx_temp_idx = nodal_glob_idx.T.flatten()
-
     def _local_stiffness(self, i, j):
         """
         Compute the local stiffness matrix for a single quadrilateral element.
@@ -515,18 +510,12 @@ class FEM(om.ImplicitComponent):
             ]
         )
 
-        stiff = np.zeros((4, 4), dtype=float)
-
-        for dN in self.dN_dxi:
-            # Compute the Jacobian matrix
-            J = dN @ nodal_coord
-
-            # Compute the B matrix
-            B = np.linalg.solve(J, dN)
+        # Compute the Jacobian and B matrices at all the quadrature points at once
+        J = self.dN_dxi @ nodal_coord
+        B = np.linalg.solve(J, self.dN_dxi)
 
-            stiff += k * (B.T @ B) * np.linalg.det(J)
-
-        return stiff
+        # Sum k * B^T B * det(J) over the quadrature points
+        return k * np.einsum("q,qai,qaj->ij", np.linalg.det(J), B, B)
 
     def _local_force(self, i, j, q):
         """
@@ -558,31 +547,64 @@ class FEM(om.ImplicitComponent):
             ]
         )
 
-        force = np.zeros((4,), dtype=float)
+        # Compute the Jacobian matrices at all the quadrature points at once
+        J = self.dN_dxi @ nodal_coord
 
-        for N, dN in zip(self.N, self.dN_dxi):
-            # Compute the Jacobian matrix
-            J = dN @ nodal_coord
+        # Sum q * N * det(J) over the quadrature points
+        return q * np.linalg.det(J) @ self.N
 
-            force += q * N * np.linalg.det(J)
+    def _factorize(self):
+        """
+        Factorize the global stiffness matrix using the appropriate sparse linear solver
+        depending on whether Pardiso or SciPy solvers are available.
 
-        return force
+        Pardiso first does a symbolic analysis (mainly the fill-reducing reordering) and then the
+        numerical factorization. The analysis depends only on the sparsity pattern, which never changes,
+        so it's done only the first time. After that, only the numerical factorization is redone
+        (phase 22 instead of 12), which is a few times faster. PyPardisoSolver.factorize always redoes
+        the analysis, so later factorizations go through _pardiso_refactorize.
 
-    def _flattened_node_ij(self, i, j):
+        SuperLU wants CSC, and the transpose of the CSR stiffness matrix is a CSC matrix that shares
+        its data, so we factorize K^T rather than converting K to CSC.
         """
-        Given the i and j index of a node, compute the single index for it
-        in the flattened vectors (for example, in the unknown temperature vector).
-        """
-        return i * self.ny + j
+        if use_pypardiso:
+            if self.lin_solver_analyzed:
+                _pardiso_refactorize(self.lin_solver, self.K_glob)
+            else:
+                self.lin_solver.factorize(self.K_glob)
+                self.lin_solver_analyzed = True
+        else:
+            self.K_glob_T_lu = splinalg.splu(self.K_glob.T)
+        self.K_glob_factorized = True
 
-    def _spsolve(self, A, b):
+    def _spsolve(self, b, transpose=False):
         """
-        Calls the appropriate sparse linear solver depending on whether Pardiso or SciPy
-        solvers are available.
+        Solve a linear system with the global stiffness matrix (or its transpose). The stiffness matrix
+        is factorized only once each time it changes and the factorization is reused for the nonlinear
+        solve and both linear solve modes.
+
+        Pardiso solves with the transpose of a CSR matrix using the same factorization when it is given
+        the CSC matrix with the same data. This calls the solver directly because pypardiso.spsolve converts
+        CSC matrices to CSR, which would trigger a new factorization of K^T. The SciPy path factorizes K^T,
+        so the solve is transposed for K and not for K^T.
+
+        Parameters
+        ----------
+        b : numpy array
+            Right hand side of the linear system.
+        transpose : bool
+            Solve with the transpose of the stiffness matrix, by default False.
+
+        Returns
+        -------
+        numpy array
+            Solution of the linear system.
         """
+        if not self.K_glob_factorized:
+            self._factorize()
         if use_pypardiso:
-            return pypardiso.spsolve(A, b, solver=self.lin_solver)
-        return splinalg.spsolve(A, b)
+            return self.lin_solver.solve(self.K_glob.T if transpose else self.K_glob, b)
+        return self.K_glob_T_lu.solve(b, trans="N" if transpose else "T")
 
     @staticmethod
     def _N(xi, eta):
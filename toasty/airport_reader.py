@@ -1,7 +1,7 @@
 from PIL import Image
 import os
-import glob
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 
 def load_airport(airport_name, resolution, min_density=1e-3, ignore_cases=[]):
@@ -60,47 +60,46 @@ def load_airport(airport_name, resolution, min_density=1e-3, ignore_cases=[]):
 
     data_dir = os.path.join(apt_dir, resolution)
 
-    # Read in the images. They'll be stored as 3D numpy arrays where the rows and columns use the same
+    # Find the images. They'll be read in as 3D numpy arrays where the rows and columns use the same
     # ordering as the meshes in TOASTY. The 3rd dimension is a 3-element array with R, G, and B values.
-    im = {}
-    try:
-        for name in ["buildings", "runways", "taxiways", "keep_out"]:
-            # If there are multiple extensions, just use the first one
-            try:
-                f = glob.glob(os.path.join(data_dir, f"{name}.*"))[0]
-                im[name] = np.flipud(np.array(Image.open(f).convert("RGB"))).astype(int)
-            except IndexError:  # no files found
-                if name == "keep_out":  # that's ok, keep out zones are not required
-                    im[name] = np.full_like(im["buildings"], 255)  # fill it with white (no keep out zones)
-                else:  # all the others are required
-                    raise FileNotFoundError(f"No {name} image found for airport configuration \"{airport_name}\"")
-
-        # Do the different approach patterns
-        im["thermals"] = {}
-        f = glob.glob(os.path.join(data_dir, "thermals_*.*"))
-        if len(f) == 0:
-            raise IndexError
-        for app in f:
-            app_name = app.split("thermals_")[-1].split(".")[0]
-            if app_name in ignore_cases:
-                continue
-            im["thermals"][app_name] = np.flipud(np.array(Image.open(app).convert("RGB"))).astype(int)
-    except IndexError:  # glob would throw an index error because it'd return an empty list
+    # They're kept as the 8 bit unsigned integers PIL gives, so be careful of overflow when doing math on them.
+    # List the directory once and pick out the images by their names
+    entries = [entry.name for entry in os.scandir(data_dir) if entry.is_file()]
+
+    files = {}
+    for name in ["buildings", "runways", "taxiways", "keep_out"]:
+        # If there are multiple extensions, just use the first one
+        f = [entry for entry in entries if entry.startswith(f"{name}.")]
+        if len(f) > 0:
+            files[name] = os.path.join(data_dir, f[0])
+        elif name != "keep_out":  # keep out zones are not required, but all the others are
+            raise FileNotFoundError(f"No {name} image found for airport configuration \"{airport_name}\"")
+
+    # Do the different approach patterns
+    thermal_files = {}
+    f = [entry for entry in entries if entry.startswith("thermals_") and "." in entry]
+    if len(f) == 0:
         raise FileNotFoundError(
             f"The data folder for {airport_name} at a resolution of {resolution} must contain images "
             + 'named "buildings", "runways", "taxiways", and "thermals_*" where "*" is any '
             + f"number of approach pattern names, but it contains only {os.listdir(data_dir)}"
         )
-
-    # Reshape them so they're ordered properly
-    nx = im["runways"].shape[1] + 1
-    ny = im["runways"].shape[0] + 1
-    for key in im.keys():
-        if key == "thermals":
-            for app in im[key].keys():
-                im[key][app] = np.transpose(im[key][app], axes=(1, 0, 2))
-        else:
-            im[key] = np.transpose(im[key], axes=(1, 0, 2))
+    for app in f:
+        app_name = app[len("thermals_") :].split(".")[0]
+        if app_name in ignore_cases:
+            continue
+        thermal_files[app_name] = os.path.join(data_dir, app)
+
+    # PIL releases the GIL while decoding, so read the images in parallel
+    with ThreadPoolExecutor() as pool:
+        im = dict(zip(files.keys(), pool.map(read_image, files.values())))
+        im["thermals"] = dict(zip(thermal_files.keys(), pool.map(read_image, thermal_files.values())))
+    if "keep_out" not in im:
+        im["keep_out"] = np.full_like(im["buildings"], 255)  # fill it with white (no keep out zones)
+
+    # Each pixel is an element, so there's one more node than pixels in each direction
+    nx = im["runways"].shape[0] + 1
+    ny = im["runways"].shape[1] + 1
 
     # Dictionary to return
     data = {
@@ -111,18 +110,14 @@ def load_airport(airport_name, resolution, min_density=1e-3, ignore_cases=[]):
     }
 
     # Figure out where the runways, buildings, and taxiways are by finding all pixels where the sum of the RGB
-    # values divided by the max sum of RGB values (255 + 255 + 255) is < 90% (not close to white)
+    # values divided by the max sum of RGB values (255 + 255 + 255) is < 90% (not close to white). The sum is
+    # done in 16 bit integers so it doesn't overflow, which avoids converting the whole image to floats.
     for obj in ["runways", "buildings", "taxiways"]:
-        data[obj] = ((1 - np.sum(im[obj], axis=2) / (3 * 255)) > 0.1).astype(float)
-        data[obj][data[obj] < 0] = 0
-        data[obj][data[obj] > 1] = 1
+        data[obj] = (np.sum(im[obj], axis=2, dtype=np.uint16) < 0.9 * 3 * 255).astype(float)
         data[obj][[0, 1], -1] *= 0  # not sure why but these squares sometimes end up red in the images
 
     # Keep out areas are red (red channel is more than twice both the blue and green channel values)
-    keep_out = (
-        (im["keep_out"][:, :, 0] > (2 * im["keep_out"][:, :, 1]))
-        & (im["keep_out"][:, :, 0] > (2 * im["keep_out"][:, :, 2]))
-    )
+    keep_out = dominant_color(im["keep_out"], 0)
     keep_out[[0, 1], -1] = True  # not sure why but these squares sometimes end up red in the images
     data["keep_out"] = keep_out.astype(float)
 
@@ -130,54 +125,84 @@ def load_airport(airport_name, resolution, min_density=1e-3, ignore_cases=[]):
     # whose red channel is more than twice the blue and green channels
     data["q_elem"] = {}
     for app in im["thermals"].keys():
-        data["q_elem"][app] = (
-            (im["thermals"][app][:, :, 0] > (2 * im["thermals"][app][:, :, 1]))
-            & (im["thermals"][app][:, :, 0] > (2 * im["thermals"][app][:, :, 2]))
-        ).astype(float)
+        data["q_elem"][app] = dominant_color(im["thermals"][app], 0).astype(float)
         data["q_elem"][app][[0, 1], -1] *= 0  # not sure why but these squares sometimes end up red in the images
 
     # Get the set temperature nodes by taking the nodes around elements
     # whose blue channel is more than twice the red and green channels
-    data["T_set_node"] = data["T_set_node"] = {}
+    data["T_set_node"] = {}
     for app in im["thermals"].keys():
-        data["T_set_node"][app] = np.zeros((nx, ny))
-        T_set_elem = (
-            (im["thermals"][app][:, :, 2] > (2 * im["thermals"][app][:, :, 0]))
-            & (im["thermals"][app][:, :, 2] > (2 * im["thermals"][app][:, :, 1]))
-        ).astype(float)
-        idx_lower_left = np.argwhere(T_set_elem)
-        data["T_set_node"][app][idx_lower_left[:, 0], idx_lower_left[:, 1] + 1] += 1
-        data["T_set_node"][app][idx_lower_left[:, 0], idx_lower_left[:, 1]] += 1
-        data["T_set_node"][app][idx_lower_left[:, 0] + 1, idx_lower_left[:, 1]] += 1
-        data["T_set_node"][app][idx_lower_left[:, 0] + 1, idx_lower_left[:, 1] + 1] += 1
-        data["T_set_node"][app][data["T_set_node"][app] != 0] /= data["T_set_node"][app][data["T_set_node"][app] != 0]
-
-    # Figure out the upper and lower bounds for the optimization problem
-    data["density_lower"] = np.zeros_like(data["runways"])
-    data["density_upper"] = np.ones_like(data["runways"])
-
-    # Taxiways must be maintained in keep out areas
-    data["density_lower"][np.logical_and(data["taxiways"] > 0.99, keep_out)] = 1.0
-    data["density_upper"][np.logical_and(data["taxiways"] < 0.01, keep_out)] = 0.0
-
-    # Runways and buildings can't conduct heat (heat-generating elements must, which is fixed later)
-    for k in ["density_upper", "density_lower"]:
-        # data[k][data["runways"] > 0.99] = 0.0  modified so runways act no differently than other space
-        data[k][data["buildings"] > 0.99] = 0.0
-
-    # Heat-generating elements must be conductive
+        T_set_elem = dominant_color(im["thermals"][app], 2)
+
+        # Mark all four corner nodes of each of these elements
+        T_set_node = np.zeros((nx, ny), dtype=bool)
+        T_set_node[:-1, :-1] |= T_set_elem
+        T_set_node[1:, :-1] |= T_set_elem
+        T_set_node[1:, 1:] |= T_set_elem
+        T_set_node[:-1, 1:] |= T_set_elem
+        data["T_set_node"][app] = T_set_node.astype(float)
+
+    # Figure out the upper and lower bounds for the optimization problem. Each of the rules below
+    # has priority over the ones before it (e.g., heat-generating elements can be in keep out zones).
+    # The masks are 0 or 1, so they are converted back to booleans to combine them.
+    taxiways = data["taxiways"] > 0.99
+    buildings = data["buildings"] > 0.99
+    heat = np.zeros_like(keep_out)
     for case in data["q_elem"].values():
-        data["density_lower"][case > 0.99] = 1.0
-        data["density_upper"][case > 0.99] = 1.0
+        heat |= case > 0.99
 
-    # Keep the density bounds within the desired range
-    for k in ["density_upper", "density_lower"]:
-        data[k][data[k] < min_density] = min_density
-        data[k][data[k] > 1.0] = 1.0
+    # Taxiways must be maintained in keep out areas and no new ones can be added there.
+    # Buildings can't conduct heat, but heat-generating elements must. Runways used to be treated
+    # like buildings, but now they act no differently than other space.
+    # Everywhere else the densities can be anywhere between min_density and 1.
+    data["density_lower"] = np.where(heat | (taxiways & keep_out & ~buildings), 1.0, min_density)
+    data["density_upper"] = np.where(~heat & (buildings | (~taxiways & keep_out)), min_density, 1.0)
 
     return data
 
 
+def read_image(file):
+    """
+    Reads in an image and returns it as an RGB array with the rows and columns in the same order as
+    the meshes in TOASTY. Flipping the image vertically and then swapping the rows and columns to get
+    the mesh ordering is the same as rotating it 90 degrees clockwise, which PIL does before it's
+    converted to an array.
+
+    Parameters
+    ----------
+    file : str
+        Path to the image file.
+
+    Returns
+    -------
+    numpy array
+        RGB image with 8 bit unsigned integer values and shape (rows x columns x 3).
+    """
+    return np.array(Image.open(file).convert("RGB").transpose(Image.Transpose.ROTATE_270))
+
+
+def dominant_color(im, channel):
+    """
+    Returns a boolean array that is True where the specified channel of the RGB image is more than
+    twice both of the other channels. This is the same as being more than twice the larger of the two.
+
+    Parameters
+    ----------
+    im : numpy array
+        RGB image with 8 bit unsigned integer values and shape (rows x columns x 3).
+    channel : int
+        Index of the channel that must be dominant (0 for red, 1 for green, and 2 for blue).
+
+    Returns
+    -------
+    numpy array
+        Boolean array with shape (rows x columns).
+    """
+    other = [i for i in range(3) if i != channel]
+    # Twice the channel values can be more than 255, so convert to 16 bit integers first
+    return im[:, :, channel] > 2 * np.maximum(im[:, :, other[0]], im[:, :, other[1]]).astype(np.uint16)
+
+
 def subdirectories(dir):
     """
     Returns a list of all the subdirectory names within the directory specified.
@@ -1,27 +1,28 @@
 import matplotlib.pyplot as plt
 import matplotlib
 import os
-from .utils import gen_mesh
 
 def debug_plots(apt_data, out_dir):
     # ==================== Bounds debug plot ====================
     lower, upper = (apt_data["density_lower"], apt_data["density_upper"])
 
-    # Create the default mesh corresponding to indexing of nodal rows/cols
+    # Plot the data as images whose extents correspond to indexing of nodal rows/cols. The
+    # element data are between the nodes and the nodal data are centered on the nodes.
     nx, ny = lower.shape
     nx += 1
     ny += 1
-    mesh_x, mesh_y = gen_mesh(nx, ny, (0, nx - 1), (0, ny - 1))
+    elem_extent = (0, nx - 1, 0, ny - 1)
+    node_extent = (-0.5, nx - 0.5, -0.5, ny - 0.5)
 
     fig, axs = plt.subplots(1, 2, figsize=(12, 8))
 
     # Plot data
-    axs[0].pcolorfast(
-        mesh_x, mesh_y, lower, cmap="binary", vmin=0.0, vmax=1.0
+    axs[0].imshow(
+        lower.T, origin="lower", extent=elem_extent, cmap="binary", vmin=0.0, vmax=1.0, interpolation="nearest"
     )
     axs[0].set_title("Lower bound")
-    axs[1].pcolorfast(
-        mesh_x, mesh_y, upper, cmap="binary", vmin=0.0, vmax=1.0
+    axs[1].imshow(
+        upper.T, origin="lower", extent=elem_extent, cmap="binary", vmin=0.0, vmax=1.0, interpolation="nearest"
     )
     axs[1].set_title("Upper bound")
 
@@ -43,8 +44,14 @@ def debug_plots(apt_data, out_dir):
     red_cmap = matplotlib.colors.LinearSegmentedColormap.from_list("", ["#ffffff", "#ff0000"])
 
     for i_case, case in enumerate(apt_data["q_elem"].keys()):
-        axs[i_case].pcolorfast(
-            mesh_x, mesh_y, apt_data["q_elem"][case], cmap=red_cmap, vmin=0.0, vmax=1.0
+        axs[i_case].imshow(
+            apt_data["q_elem"][case].T,
+            origin="lower",
+            extent=elem_extent,
+            cmap=red_cmap,
+            vmin=0.0,
+            vmax=1.0,
+            interpolation="nearest",
         )
         axs[i_case].set_xlabel("Nodal row index")
         axs[i_case].set_ylabel("Nodal column index")
@@ -61,8 +68,14 @@ def debug_plots(apt_data, out_dir):
     blue_cmap = matplotlib.colors.LinearSegmentedColormap.from_list("", ["#ffffff", "#0000ff"])
 
     for i_case, case in enumerate(apt_data["T_set_node"].keys()):
-        axs[i_case].contourf(
-            mesh_x, mesh_y, apt_data["T_set_node"][case], cmap=blue_cmap, vmin=0.0, vmax=1.0
+        axs[i_case].imshow(
+            apt_data["T_set_node"][case].T,
+            origin="lower",
+            extent=node_extent,
+            cmap=blue_cmap,
+            vmin=0.0,
+            vmax=1.0,
+            interpolation="nearest",
         )
         axs[i_case].set_xlabel("Nodal row index")
         axs[i_case].set_ylabel("Nodal column index")
@@ -2,7 +2,11 @@ import openmdao.api as om
 import openmdao.utils.assert_utils as om_assert
 import numpy as np
 import unittest
+import tempfile
+import os
+from unittest import mock
 from toasty import FEM
+from toasty.FEM_comp import use_pypardiso
 
 
 class SingleElem(unittest.TestCase):
@@ -29,7 +33,7 @@ class SingleElem(unittest.TestCase):
 
         K_loc = fem._local_stiffness(0, 0)
 
-        np.testing.assert_allclose(K_loc, fem.K_glob.toarray()[np.ix_(self.idx_glob, self.idx_glob)])
+        np.testing.assert_allclose(K_loc, fem.K_glob[self.idx_glob, :][:, self.idx_glob].toarray())
         np.testing.assert_allclose(0.0, fem.F_glob)
 
     def test_single_elem_set_temp(self):
@@ -51,8 +55,8 @@ class SingleElem(unittest.TestCase):
         F = np.zeros((self.nx * self.ny))
         F[0] = self.T_set[0, 0]
 
-        np.testing.assert_allclose(K_loc, fem.K_glob.toarray()[np.ix_(self.idx_glob, self.idx_glob)])
-        np.testing.assert_allclose(F, fem.F_glob.flatten())
+        np.testing.assert_allclose(K_loc, fem.K_glob[self.idx_glob, :][:, self.idx_glob].toarray())
+        np.testing.assert_allclose(F, fem.F_glob)
 
         # No heat added or removed, so all temps should be the temp of the set one
         np.testing.assert_allclose(self.T_set[0, 0], p.get_val("temp"))
@@ -203,6 +207,301 @@ class FourElem(unittest.TestCase):
         om_assert.assert_check_partials(self.p.check_partials(), atol=5e-6, rtol=5e-8)
 
 
+# Regression value of the 4x4 node global stiffness matrix with all densities equal to one
+_K_GLOB_NINE = np.array(
+    [
+        [
+            666.66666667,
+            -166.66666667,
+            0.0,
+            0.0,
+            -166.66666667,
+            -333.33333333,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            -166.66666667,
+            1333.33333333,
+            -166.66666667,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            -166.66666667,
+            1333.33333333,
+            -166.66666667,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            -166.66666667,
+            666.66666667,
+            0.0,
+            0.0,
+            -333.33333333,
+            -166.66666667,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            -166.66666667,
+            -333.33333333,
+            0.0,
+            0.0,
+            1333.33333333,
+            -333.33333333,
+            0.0,
+            0.0,
+            -166.66666667,
+            -333.33333333,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            2666.66666667,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            2666.66666667,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            -333.33333333,
+            -166.66666667,
+            0.0,
+            0.0,
+            -333.33333333,
+            1333.33333333,
+            0.0,
+            0.0,
+            -333.33333333,
+            -166.66666667,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -166.66666667,
+            -333.33333333,
+            0.0,
+            0.0,
+            1333.33333333,
+            -333.33333333,
+            0.0,
+            0.0,
+            -166.66666667,
+            -333.33333333,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            2666.66666667,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            2666.66666667,
+            -333.33333333,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -333.33333333,
+            -166.66666667,
+            0.0,
+            0.0,
+            -333.33333333,
+            1333.33333333,
+            0.0,
+            0.0,
+            -333.33333333,
+            -166.66666667,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -166.66666667,
+            -333.33333333,
+            0.0,
+            0.0,
+            666.66666667,
+            -166.66666667,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            -166.66666667,
+            1333.33333333,
+            -166.66666667,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -333.33333333,
+            -333.33333333,
+            -333.33333333,
+            0.0,
+            -166.66666667,
+            1333.33333333,
+            -166.66666667,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -333.33333333,
+            -166.66666667,
+            0.0,
+            0.0,
+            -166.66666667,
+            666.66666667,
+        ],
+    ]
+)
+
+
 class NineElem(unittest.TestCase):
     """
     The 9-element case covers all possible element arrangements (I believe) because it
@@ -218,298 +517,7 @@ class NineElem(unittest.TestCase):
         self.T_set = np.full((self.nx, self.ny), np.inf)  # don't set any temperatures
         self.q = np.zeros((self.nx - 1, self.ny - 1))
 
-        self.K_glob = np.array(
-            [
-                [
-                    666.66666667,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    -166.66666667,
-                    1333.33333333,
-                    -166.66666667,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    -166.66666667,
-                    1333.33333333,
-                    -166.66666667,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    666.66666667,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    -166.66666667,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    1333.33333333,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    2666.66666667,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    2666.66666667,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    1333.33333333,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    1333.33333333,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    2666.66666667,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    2666.66666667,
-                    -333.33333333,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    1333.33333333,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -166.66666667,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    -333.33333333,
-                    0.0,
-                    0.0,
-                    666.66666667,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    -166.66666667,
-                    1333.33333333,
-                    -166.66666667,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -333.33333333,
-                    -333.33333333,
-                    0.0,
-                    -166.66666667,
-                    1333.33333333,
-                    -166.66666667,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -333.33333333,
-                    -166.66666667,
-                    0.0,
-                    0.0,
-                    -166.66666667,
-                    666.66666667,
-                ],
-            ]
-        )
+        self.K_glob = _K_GLOB_NINE.copy()
 
     def test_stiffness(self):
         """
@@ -539,7 +547,7 @@ class NineElem(unittest.TestCase):
         F[self.ny + 1] = self.T_set[1, 1]
 
         np.testing.assert_allclose(self.K_glob, fem.K_glob.toarray())
-        np.testing.assert_allclose(F, fem.F_glob.flatten())
+        np.testing.assert_allclose(F, fem.F_glob)
 
     def test_partials(self):
         """
@@ -571,6 +579,214 @@ class NineElem(unittest.TestCase):
 
         om_assert.assert_check_partials(p.check_partials(), atol=1e-5, rtol=1e-8)
 
+    def test_totals_rev(self):
+        """
+        Test reverse mode total derivatives of temperatures that include a set node.
+        """
+        self.T_set[1, 1] = 10.0
+        self.q[2, 1] = 1e3
+
+        p = om.Problem()
+        p.model.add_subsystem("fem", FEM(num_x=self.nx, num_y=self.ny, T_set=self.T_set, q=self.q), promotes=["*"])
+        p.model.add_design_var("density")
+        p.model.add_constraint("temp", indices=[self.ny + 1, 2 * self.ny + 2])
+        p.setup(mode="rev")
+
+        p.set_val("density", self.rand.random((self.nx - 1, self.ny - 1)).flatten())
+        p.run_model()
+
+        om_assert.assert_check_totals(p.check_totals(out_stream=None), atol=1e-5, rtol=1e-5)
+
+    def test_rev_solve_reuses_factorization(self):
+        """
+        Check that reverse mode solves with the transposed stiffness matrix reuse the factorization
+        from the nonlinear solve, both the first time and after the densities change.
+        """
+        self.T_set[1, 1] = 10.0
+        self.q[2, 1] = 1e3
+
+        p = om.Problem()
+        fem = p.model.add_subsystem(
+            "fem", FEM(num_x=self.nx, num_y=self.ny, T_set=self.T_set, q=self.q), promotes=["*"]
+        )
+        p.model.add_design_var("density")
+        p.model.add_constraint("temp", indices=[self.ny + 1, 2 * self.ny + 2])
+        p.setup(mode="rev")
+
+        # Record the Pardiso phase of every solve, which is 33 only if the existing factorization is used
+        phases = []
+        if use_pypardiso:
+            solve = fem.lin_solver.solve
+
+            def solve_and_record_phase(A, b):
+                x = solve(A, b)
+                phases.append(fem.lin_solver.phase)
+                return x
+
+            fem.lin_solver.solve = solve_and_record_phase
+
+        for _ in range(2):
+            p.set_val("density", self.rand.random((self.nx - 1, self.ny - 1)).flatten())
+            p.run_model()
+
+            phases.clear()
+            with mock.patch.object(fem, "_factorize", wraps=fem._factorize) as factorize:
+                p.compute_totals()
+            factorize.assert_not_called()
+            self.assertTrue(all(phase == 33 for phase in phases))
+
+        om_assert.assert_check_totals(p.check_totals(out_stream=None), atol=1e-5, rtol=1e-5)
+
+    def test_plot(self):
+        """
+        Check that the plots rendered in the background are written by cleanup and that
+        the model can still be run after cleanup.
+        """
+        self.T_set[1, 1] = 10.0
+        self.q[2, 1] = 1e3
+
+        with tempfile.TemporaryDirectory() as plot_dir:
+            p = om.Problem()
+            p.model.add_subsystem(
+                "fem", FEM(num_x=self.nx, num_y=self.ny, T_set=self.T_set, q=self.q, plot=[plot_dir, 1]), promotes=["*"]
+            )
+            p.setup()
+
+            for _ in range(2):
+                p.set_val("density", self.rand.random((self.nx - 1, self.ny - 1)).flatten())
+                p.run_model()
+            p.cleanup()
+
+            self.assertEqual(["opt_00000.png", "opt_00001.png"], sorted(os.listdir(plot_dir)))
+
+            p.run_model()
+            p.cleanup()
+
+            self.assertEqual(["opt_00000.png", "opt_00001.png", "opt_00002.png"], sorted(os.listdir(plot_dir)))
+
+
+# Regression value of the 3x4 node global stiffness matrix with all densities equal to one
+_K_GLOB_RECT = np.array(
+    [
+        [722.22222222, -388.88888889, 0.0, 0.0, 27.77777778, -361.11111111, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        [
+            -388.88888889,
+            1444.44444444,
+            -388.88888889,
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [
+            0.0,
+            -388.88888889,
+            1444.44444444,
+            -388.88888889,
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+        ],
+        [0.0, 0.0, -388.88888889, 722.22222222, 0.0, 0.0, -361.11111111, 27.77777778, 0.0, 0.0, 0.0, 0.0],
+        [
+            27.77777778,
+            -361.11111111,
+            0.0,
+            0.0,
+            1444.44444444,
+            -777.77777778,
+            0.0,
+            0.0,
+            27.77777778,
+            -361.11111111,
+            0.0,
+            0.0,
+        ],
+        [
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+            -777.77777778,
+            2888.88888889,
+            -777.77777778,
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+        ],
+        [
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+            -777.77777778,
+            2888.88888889,
+            -777.77777778,
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+        ],
+        [
+            0.0,
+            0.0,
+            -361.11111111,
+            27.77777778,
+            0.0,
+            0.0,
+            -777.77777778,
+            1444.44444444,
+            0.0,
+            0.0,
+            -361.11111111,
+            27.77777778,
+        ],
+        [0.0, 0.0, 0.0, 0.0, 27.77777778, -361.11111111, 0.0, 0.0, 722.22222222, -388.88888889, 0.0, 0.0],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+            -388.88888889,
+            1444.44444444,
+            -388.88888889,
+            0.0,
+        ],
+        [
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            0.0,
+            -361.11111111,
+            55.55555556,
+            -361.11111111,
+            0.0,
+            -388.88888889,
+            1444.44444444,
+            -388.88888889,
+        ],
+        [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, -361.11111111, 27.77777778, 0.0, 0.0, -388.88888889, 722.22222222],
+    ]
+)
+
 
 class RectangularMesh(unittest.TestCase):
     """
@@ -586,126 +802,7 @@ class RectangularMesh(unittest.TestCase):
         self.T_set = np.full((self.nx, self.ny), np.inf)  # don't set any temperatures
         self.q = np.zeros((self.nx - 1, self.ny - 1))
 
-        self.K_glob = np.array(
-            [
-                [722.22222222, -388.88888889, 0.0, 0.0, 27.77777778, -361.11111111, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
-                [
-                    -388.88888889,
-                    1444.44444444,
-                    -388.88888889,
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    -388.88888889,
-                    1444.44444444,
-                    -388.88888889,
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                ],
-                [0.0, 0.0, -388.88888889, 722.22222222, 0.0, 0.0, -361.11111111, 27.77777778, 0.0, 0.0, 0.0, 0.0],
-                [
-                    27.77777778,
-                    -361.11111111,
-                    0.0,
-                    0.0,
-                    1444.44444444,
-                    -777.77777778,
-                    0.0,
-                    0.0,
-                    27.77777778,
-                    -361.11111111,
-                    0.0,
-                    0.0,
-                ],
-                [
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                    -777.77777778,
-                    2888.88888889,
-                    -777.77777778,
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                    -777.77777778,
-                    2888.88888889,
-                    -777.77777778,
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    -361.11111111,
-                    27.77777778,
-                    0.0,
-                    0.0,
-                    -777.77777778,
-                    1444.44444444,
-                    0.0,
-                    0.0,
-                    -361.11111111,
-                    27.77777778,
-                ],
-                [0.0, 0.0, 0.0, 0.0, 27.77777778, -361.11111111, 0.0, 0.0, 722.22222222, -388.88888889, 0.0, 0.0],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                    -388.88888889,
-                    1444.44444444,
-                    -388.88888889,
-                    0.0,
-                ],
-                [
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    0.0,
-                    -361.11111111,
-                    55.55555556,
-                    -361.11111111,
-                    0.0,
-                    -388.88888889,
-                    1444.44444444,
-                    -388.88888889,
-                ],
-                [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, -361.11111111, 27.77777778, 0.0, 0.0, -388.88888889, 722.22222222],
-            ]
-        )
+        self.K_glob = _K_GLOB_RECT.copy()
 
     def test_stiffness(self):
         """
@@ -735,7 +832,7 @@ class RectangularMesh(unittest.TestCase):
         F[self.ny + 1] = self.T_set[1, 1]
 
         np.testing.assert_allclose(self.K_glob, fem.K_glob.toarray())
-        np.testing.assert_allclose(F, fem.F_glob.flatten())
+        np.testing.assert_allclose(F, fem.F_glob)
 
     def test_partials(self):
         """
@@ -11,6 +11,7 @@ class AssembledProblem(unittest.TestCase):
         self.nx = nx = 9
         self.ny = ny = 13
         self.n_elem = (nx - 1) * (ny - 1)
+        self.density = self.rand.random(self.n_elem)
         xlim = (0.0, 2.0)
         ylim = (-1.0, 3.0)
 
@@ -41,21 +42,20 @@ class AssembledProblem(unittest.TestCase):
         """
         Do a regression test on some values
         """
-        density = self.rand.random(self.n_elem)
-        self.p.set_val("density_dv", density)
+        self.p.set_val("density_dv", self.density)
         self.p.run_model()
 
-        np.testing.assert_allclose(np.sum(density), self.p.get_val("mass").item(), atol=1e-8, rtol=1e-8)
+        np.testing.assert_allclose(np.sum(self.density), self.p.get_val("mass").item(), atol=1e-8, rtol=1e-8)
         np.testing.assert_allclose(1134.052863, self.p.get_val("max_temp").item(), atol=1e-8, rtol=1e-8)
 
     def test_partial_derivs(self):
-        self.p.set_val("density_dv", self.rand.random(self.n_elem))
+        self.p.set_val("density_dv", self.density)
         self.p.run_model()
 
         om_assert.assert_check_partials(self.p.check_partials(), atol=8e-4, rtol=2e-6)
 
     def test_total_derivs(self):
-        self.p.set_val("density_dv", self.rand.random(self.n_elem))
+        self.p.set_val("density_dv", self.density)
         self.p.run_model()
 
         om_assert.assert_check_totals(self.p.check_totals(["mass", "max_temp"], "density_dv"), atol=6e-2, rtol=1e-5)
@@ -49,6 +49,42 @@ class TestMass(unittest.TestCase):
         om_assert.assert_check_partials(p.check_partials())
 
 
+class TestAvgTemp(unittest.TestCase):
+    def setUp(self):
+        self.rand = np.random.default_rng(91)
+        self.nx = nx = 4
+        self.ny = ny = 5
+
+        self.p = p = om.Problem()
+        p.model.add_subsystem("avg", AvgTemp(num_x=nx, num_y=ny), promotes=["*"])
+        p.setup()
+
+    def test_values(self):
+        """
+        Do a regression test on some values
+        """
+        nx, ny = (self.nx, self.ny)
+
+        self.p.set_val("density", self.rand.random((nx - 1) * (ny - 1)))
+        self.p.set_val("temp", 300.0 + 100 * self.rand.random(nx * ny))
+        self.p.run_model()
+
+        avg_temp = self.p.get_val("avg_temp")
+        np.testing.assert_allclose([101.63036802, 326.38070887, 277.7980286], avg_temp[:3], rtol=1e-8)
+        np.testing.assert_allclose(2531.702389912433, np.sum(avg_temp), rtol=1e-8)
+
+    def test_partials(self):
+        nx, ny = (self.nx, self.ny)
+
+        # Check twice with different densities to make sure the partials don't depend on previous values
+        for _ in range(2):
+            self.p.set_val("density", self.rand.random((nx - 1) * (ny - 1)))
+            self.p.set_val("temp", 300.0 + 100 * self.rand.random(nx * ny))
+            self.p.run_model()
+
+            om_assert.assert_check_partials(self.p.check_partials(), atol=5e-6, rtol=5e-6)
+
+
 class TestPenalizeDensity(unittest.TestCase):
     def setUp(self):
         self.rand = np.random.default_rng(58)
@@ -128,6 +164,29 @@ class TestLinearDensityFilter(unittest.TestCase):
 
         om_assert.assert_check_partials(p.check_partials(), atol=5e-6, rtol=5e-6)
 
+    def test_weights(self):
+        """
+        Check the filter weights on a mesh where the radius reaches the neighboring elements.
+        """
+        nx = ny = 4
+
+        p = om.Problem()
+        filt = p.model.add_subsystem("filter", LinearDensityFilter(num_x=nx, num_y=ny, r=0.5), promotes=["*"])
+        p.setup()
+
+        # Every row of weights should sum to one
+        np.testing.assert_allclose(filt.weight_mtx.sum(axis=1), 1.0)
+
+        # Corner element is weighted by itself, its two edge neighbors, and its diagonal neighbor
+        weights_corner = np.zeros((nx - 1) * (ny - 1))
+        weights_corner[[0, 1, 3, 4]] = np.array([9.0, 5.0, 5.0, 1.0]) / 20
+        np.testing.assert_allclose(filt.weight_mtx[[0], :].toarray().flatten(), weights_corner)
+
+        p.set_val("density", self.rand.random(((nx - 1) * (ny - 1))))
+        p.run_model()
+
+        om_assert.assert_check_partials(p.check_partials(), atol=5e-6, rtol=5e-6)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -48,7 +48,7 @@ class Mass(om.ExplicitComponent):
         self.declare_partials("mass", "density", val=1.0)
 
     def compute(self, inputs, outputs):
-        outputs["mass"] = np.sum(inputs["density"])
+        outputs["mass"] = inputs["density"].sum()
 
 
 class LinearDensityFilter(om.ExplicitComponent):
@@ -111,61 +111,43 @@ class LinearDensityFilter(om.ExplicitComponent):
         self.add_input("density", shape=(n_elem,))
         self.add_output("density_filtered", shape=(n_elem,))
 
-        rows = []
-        cols = []
-        vals = []
-
-        # TODO: make this faster
-
-        # Loop over the densities to be weighted
-        slow_str = " sorry I'm slow :("
-        for idx_x in range(nx - 1):
-            for idx_y in range(ny - 1):
-                # Row in the filtering matrix, which corresponds to the density of element (idx_x, idx_y), which we call i
-                row_idx = idx_x * (ny - 1) + idx_y
-
-                if row_idx % 10000 == 5000:
-                    time_left = (n_elem - row_idx) / (row_idx + 1) * (time() - t_start)
-                    print(
-                        f"    I'll be done in {time_left:.0f} sec{slow_str if time_left > 10 else ''}                                 ",
-                        end="\r",
-                    )
-
-                # Centroid coordinates of the element whose density is being weighted
-                xi, yi = ((idx_x + 0.5) * x_spacing, (idx_y + 0.5) * y_spacing)
-
-                # Box that contains all elements within the specified radius (+1 is because arange is exclusive)
-                x_neighbor_list = np.arange(max(0, idx_x - r_idx_x), min(nx - 2, idx_x + r_idx_x) + 1, dtype=int)
-                y_neighbor_list = np.arange(max(0, idx_y - r_idx_y), min(ny - 2, idx_y + r_idx_y) + 1, dtype=int)
-                idx_x_neighbor, idx_y_neighbor = np.meshgrid(x_neighbor_list, y_neighbor_list, indexing="ij")
-                idx_x_neighbor = idx_x_neighbor.flatten()
-                idx_y_neighbor = idx_y_neighbor.flatten()
-
-                # Columns in the filtering matrix that correspond to the effect of the density of
-                # neighboring elements on the filtered density of element i
-                col_idx = idx_x_neighbor * (ny - 1) + idx_y_neighbor
-
-                # Centroid coordinates of element j
-                xj, yj = ((idx_x_neighbor + 0.5) * x_spacing, (idx_y_neighbor + 0.5) * y_spacing)
-
-                # Weight of element j on element i
-                wj = 1 - ((xj - xi) ** 2 + (yj - yi) ** 2) / r**2
-                idx_nonzero = wj > 0.0
-
-                # Get rid of the nonzero elements
-                wj = wj[idx_nonzero]
-                rows_i = np.full(wj.shape, row_idx, dtype=int)
-                cols_i = col_idx[idx_nonzero]
-
-                # Normalize the weights
-                wj /= np.sum(wj)
-
-                # Add the vals, rows, cols to the lists
-                rows.append(rows_i)
-                cols.append(cols_i)
-                vals.append(wj)
-
-        self.weight_mtx = sp.csr_matrix((np.hstack(vals), (np.hstack(rows), np.hstack(cols))), shape=(n_elem, n_elem))
+        # Element indices of every element, which we call i, flattened in the same order as the densities
+        idx_x, idx_y = np.meshgrid(np.arange(nx - 1), np.arange(ny - 1), indexing="ij")
+        idx_x = idx_x.reshape(-1, 1)
+        idx_y = idx_y.reshape(-1, 1)
+
+        # Index offsets of the box that contains all elements within the specified radius
+        offset_x, offset_y = np.meshgrid(
+            np.arange(-r_idx_x, r_idx_x + 1), np.arange(-r_idx_y, r_idx_y + 1), indexing="ij"
+        )
+        offset_x = offset_x.flatten()
+        offset_y = offset_y.flatten()
+
+        # The weight of element j on element i only depends on the offset between their centroids, so compute
+        # it once for the box and drop the offsets outside the filter radius before looking at any elements
+        w_offset = 1 - ((offset_x * x_spacing) ** 2 + (offset_y * y_spacing) ** 2) / r**2
+        in_radius = w_offset > 0.0
+        offset_x, offset_y, w_offset = (offset_x[in_radius], offset_y[in_radius], w_offset[in_radius])
+
+        # Neighboring elements, which we call j, for every element i (rows are i, columns are the offsets)
+        idx_x_neighbor = idx_x + offset_x
+        idx_y_neighbor = idx_y + offset_y
+
+        # Keep only the neighbors that are inside the mesh
+        keep = (idx_x_neighbor >= 0) & (idx_x_neighbor < nx - 1)
+        keep &= (idx_y_neighbor >= 0) & (idx_y_neighbor < ny - 1)
+
+        # Normalize the weights so each row sums to one
+        wj = np.where(keep, w_offset, 0.0)
+        wj /= np.sum(wj, axis=1, keepdims=True)
+
+        # Row in the filtering matrix corresponds to the density of element i and the column to element j. The
+        # kept entries are already in row order with increasing columns, so they can go straight into CSR format.
+        cols = (idx_x_neighbor * (ny - 1) + idx_y_neighbor)[keep]
+        row_ptr = np.zeros(n_elem + 1, dtype=int)
+        np.cumsum(np.count_nonzero(keep, axis=1), out=row_ptr[1:])
+
+        self.weight_mtx = sp.csr_matrix((wj[keep], cols, row_ptr), shape=(n_elem, n_elem))
         self.declare_partials("density_filtered", "density", val=self.weight_mtx)
         print(f"    ...done in {time() - t_start} sec")
 
@@ -211,7 +193,7 @@ class PenalizeDensity(om.ExplicitComponent):
         self.add_input("density", shape=(n_elem,))
         self.add_output("density_penalized", shape=(n_elem,))
 
-        arng = np.arange(n_elem)
+        arng = np.arange(n_elem, dtype=np.int32)
         self.declare_partials("density_penalized", "density", rows=arng, cols=arng)
 
     def compute(self, inputs, outputs):
@@ -241,7 +223,7 @@ class SmoothStep(om.ExplicitComponent):
         self.add_input("in", shape=(self.size,))
         self.add_output("out", shape=(self.size,))
 
-        self.inds = np.arange(self.size).tolist()
+        self.inds = np.arange(self.size, dtype=np.int32)
         self.declare_partials("out", "in", rows=self.inds, cols=self.inds)
 
     def compute(self, inputs, outputs):
@@ -259,12 +241,13 @@ class SmoothStep(om.ExplicitComponent):
     def compute_partials(self, inputs, partials):
         # Normalize the x values to the range [0, 1] and compute rational polynomial derivative
         x_scaled = (inputs["in"] - self.options["x_min"]) / (self.options["x_max"] - self.options["x_min"])
-        dYdX_scaled = (
-            self.options["n"]
-            * x_scaled ** (self.options["n"] - 1)
-            * (1.0 - x_scaled) ** (self.options["n"] - 1)
-            / (x_scaled ** self.options["n"] + (1.0 - x_scaled) ** self.options["n"]) ** 2
-        )
+        one_minus_x = 1.0 - x_scaled
+
+        # Reuse the n - 1 powers in the numerator to get the n powers in the denominator
+        x_pow = x_scaled ** (self.options["n"] - 1)
+        one_minus_x_pow = one_minus_x ** (self.options["n"] - 1)
+        denom = x_pow * x_scaled + one_minus_x_pow * one_minus_x
+        dYdX_scaled = self.options["n"] * x_pow * one_minus_x_pow / denom**2
 
         # Clip the values outside the step range
         dYdX_scaled = np.where(x_scaled < 0.0, 0.0, dYdX_scaled)
@@ -325,26 +308,29 @@ class AvgTemp(om.ExplicitComponent):
 
         self.add_output("avg_temp", shape=(n_elem,))
 
-        arng = np.arange(n_elem)
+        arng = np.arange(n_elem, dtype=np.int32)
         self.declare_partials("avg_temp", "density", rows=arng, cols=arng)
 
-        self.declare_partials("avg_temp", "temp", rows=np.repeat(np.arange(n_elem), 4), cols=self.node_idx.T.flatten())
+        self.declare_partials(
+            "avg_temp", "temp", rows=np.repeat(arng, 4), cols=self.node_idx.T.flatten().astype(np.int32)
+        )
+        self.temp_partials = np.zeros(4 * n_elem)
 
     def compute(self, inputs, outputs):
-        outputs["avg_temp"] *= 0.0
-
-        for idx in self.node_idx:
-            outputs["avg_temp"] += inputs["temp"][idx]
-
-        outputs["avg_temp"] *= inputs["density"] / 4
+        # Gather the four corner temperatures of every element at once and average them
+        # directly in the output vector to avoid extra temporaries
+        avg_temp = outputs["avg_temp"]
+        inputs["temp"][self.node_idx].sum(axis=0, out=avg_temp)
+        avg_temp *= inputs["density"]
+        avg_temp /= 4
 
     def compute_partials(self, inputs, jacobian):
-        jacobian["avg_temp", "density"] *= 0
-        for idx in self.node_idx:
-            jacobian["avg_temp", "density"] += inputs["temp"][idx] / 4
+        jacobian["avg_temp", "density"] = inputs["temp"][self.node_idx].sum(axis=0) / 4
 
-        jacobian["avg_temp", "temp"] *= 0
-        jacobian["avg_temp", "temp"] += np.repeat(inputs["density"], 4) / 4
+        # Each element's four corner partials are adjacent, so broadcast the densities into a preallocated
+        # buffer instead of allocating a new array with np.repeat every time
+        self.temp_partials.reshape(-1, 4)[:] = (inputs["density"] / 4)[:, np.newaxis]
+        jacobian["avg_temp", "temp"] = self.temp_partials
 
 
 class MaskKeepOut(om.ExplicitComponent):
@@ -405,7 +391,7 @@ class MaskKeepOut(om.ExplicitComponent):
         self.add_input("temp", shape=(nx * ny,))
         self.add_output("masked_temp", shape=(nx * ny,))
 
-        arng = np.arange(nx * ny)
+        arng = np.arange(nx * ny, dtype=np.int32)
         self.declare_partials("masked_temp", "temp", rows=arng, cols=arng, val=self.mask)
 
     def compute(self, inputs, outputs):
@@ -444,7 +430,7 @@ class Multiply(om.ExplicitComponent):
         self.add_input("B", shape=(n,))
         self.add_output("product", shape=(n,))
 
-        arng = np.arange(n)
+        arng = np.arange(n, dtype=np.int32)
         self.declare_partials("product", ["A", "B"], rows=arng, cols=arng)
 
     def computes(self, inputs, outputs):